@@ -7,7 +7,8 @@ Default method considers periodic boundaries
 Use: dist(array_input, origin, dist_type)
 Where:
 	- array_input: numpy binary array (1 - foreground; 0 - background)
-	- origin: tuple (x, y, (z))) representing coordinates used as starting point for transformation
+	- origin: tuple (x, y, (z))) representing coordinates used as starting point for transformation,
+	  or a list of such tuples (distance to the nearest of them, computed in a single transform)
 	- dist_type: distance metric used
 		"city" = cityblock
 		"chess" = chessboard
@@ -26,9 +27,61 @@ For more information see docstrings for each function
 
 '''
 
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from PIL import Image
 
+try:
+	from scipy import ndimage
+except ImportError:
+	ndimage = None
+	#scipy is optional, only used for the non-periodic fast path in dist()
+
+try:
+	import cv2
+except ImportError:
+	cv2 = None
+	#opencv is optional, only used (before scipy) for the non-periodic fast path of 2D arrays in dist()
+
+try:
+	import gdt_numba
+except ImportError:
+	gdt_numba = None
+	#numba is optional, without it the wavefront is expanded in pure python
+
+try:
+	import gdt_simd
+except ImportError:
+	gdt_simd = None
+	#libgdt_simd.so is optional (built from gdt_simd.c), only used for 2D non-periodic arrays
+
+
+_OFFSETS_2D = np.array([
+	[-1, 0], [1, 0], [0, -1], [0, 1],
+	[-1, -1], [-1, 1], [1, -1], [1, 1]], dtype=np.int32)
+#First 4 values correspond to 4-adyacents, last 4 to the extra 4 found in 8-adyacents
+
+_OFFSETS_3D = np.array([
+	[-1, 0, 0], [1, 0, 0], [0, -1, 0], [0, 1, 0], [0, 0, -1], [0, 0, 1],
+	[-1, -1, 0], [-1, 1, 0], [1, -1, 0], [1, 1, 0], [-1, 0, -1], [-1, 0, 1],
+	[1, 0, -1], [1, 0, 1], [0, -1, -1], [0, -1, 1], [0, 1, -1], [0, 1, 1],
+	[-1, -1, -1], [-1, -1, 1], [-1, 1, -1], [-1, 1, 1],
+	[1, -1, -1], [1, -1, 1], [1, 1, -1], [1, 1, 1]], dtype=np.int32)
+#1st-6th elements: single-displacement, 6th-18th: double-displacement, 18th-26th: triple-displacement
+
+_PESOS_2D = {
+	"city": np.array([1, 1, 1, 1], dtype=np.int32),	#only cityblock uses 4-adyacent expansion
+	"chess": np.array([1, 1, 1, 1, 1, 1, 1, 1], dtype=np.int32),
+	"borges": np.array([3, 3, 3, 3, 4, 4, 4, 4], dtype=np.int32),
+	"quasi": np.array([5, 5, 5, 5, 7, 7, 7, 7], dtype=np.int32)}
+_PESOS_3D = {
+	"city": np.ones(6, dtype=np.int32),
+	"chess": np.ones(26, dtype=np.int32),
+	"borges": np.repeat(np.array([3, 4, 5], dtype=np.int32), [6, 12, 8]),
+	"quasi": np.repeat(np.array([10, 14, 17], dtype=np.int32), [6, 12, 8])}
+#Distance added to each adyacent (same order as offsets), its length is the number of adyacency used
+
 
 def dist (array_input, origin, dist_type, periodic_boundaries = True):
 	'''
@@ -38,256 +91,339 @@ def dist (array_input, origin, dist_type, periodic_boundaries = True):
 	Input:
 		- array_input: numpy binary array (1 - foreground; 0 - background)
 		- origin: tuple (x, y, (z)) representing coordinates used as starting point for transformation")
+		  or a list of tuples: every one of them is a starting point and the distance is to the nearest of them
+		  (same result as the minimum of one dist() per tuple, at the cost of a single one)
 		- dist_type: distance metric used:
 			- "city" = cityblock
 			- "chess" = chessboard
 			- "borges" = borgefors
 			- "quasi" = quasi-euclidean
-	Output: array where values represent distance (may be infinite)
+	Output: float32 array where values represent distance (may be infinite)
 	'''
+	if array_input.ndim not in [2, 3]:
+		raise Exception ("Error: Incorrect array dimensions (only 2D or 3D)")
+	if dist_type not in _PESOS_2D:
+		raise Exception ("Error: "+dist_type+" calculation method does not exist")
+	periodic_boundaries = bool(periodic_boundaries)
+	#Kernels specialize on it with numba literally(), which only takes python bools (not numpy ones)
+
+	origenes = _origenes(origin, array_input.shape)
+
+	if not periodic_boundaries and dist_type in ["city", "chess"] and np.all(array_input > 0):
+		if cv2 is not None and array_input.ndim == 2:
+			return _dist_cv2(array_input, origenes, dist_type)
+		if ndimage is not None:
+			return _dist_scipy(array_input, origenes, dist_type)
+	#Obstacle-free arrays without periodic boundaries are solved by opencv (2D) or scipy in native code
+
 	if array_input.ndim == 2:
-		return _dist2d(array_input, origin, dist_type, periodic_boundaries)
-	elif array_input.ndim == 3:
-		return _dist3d(array_input, origin, dist_type, periodic_boundaries)
+		return _dist2d(array_input, origenes, dist_type, periodic_boundaries)
 	else:
-		raise Exception ("Error: Incorrect array dimensions (only 2D or 3D)")
+		return _dist3d(array_input, origenes, dist_type, periodic_boundaries)
 
 #end dist()
 
 
 
-def _dist2d (array_input, origin, dist_type, periodic_boundaries):
+def _origenes (origin, shape):
+	'''
+	Returns origin (one tuple of coordinates or a list of them) as an (n_origenes, ndim) int64 array
+	Negative coordinates are taken from the end of each axis, as numpy indexing does
+	'''
+	origenes = np.array(origin)
+	if origenes.ndim == 1:
+		origenes = origenes[None]
+	if origenes.ndim != 2 or len(origenes) == 0 or origenes.shape[1] != len(shape):
+		raise Exception ("Error: origin must be a tuple of "+str(len(shape))+" coordinates or a list of them")
+	if origenes.dtype.kind not in "iu":
+		raise Exception ("Error: origin coordinates must be integers")
+	origenes = origenes.astype(np.int64)
+	if np.any(origenes < -np.array(shape)) or np.any(origenes >= np.array(shape)):
+		raise Exception ("Error: Chosen origin is out of the array")
+	return origenes % np.array(shape)
+
+#end origenes()
+
+
+
+def _dist_cv2 (array_input, origenes, dist_type):
+	'''
+	Returns distance transform computed by cv2.distanceTransform (two raster scans in C++), 2D only
+	Same restriction as _dist_scipy(): no obstacles and no periodic boundaries
+	DIST_L1 / DIST_C with the 3x3 mask give city / chess, opencv has no mask with the pesos of borges or quasi
+	'''
+	src = np.ones(array_input.shape, dtype=np.uint8)
+	src[tuple(origenes.T)] = 0	#origenes are the only zeros -> distances are measured from them
+	if dist_type == "city":
+		metric = cv2.DIST_L1
+	else:
+		metric = cv2.DIST_C
+	return cv2.distanceTransform(src, metric, cv2.DIST_MASK_3, dstType=cv2.CV_32F)
+
+#end dist_cv2()
+
+
+
+def _dist_scipy (array_input, origenes, dist_type):
+	'''
+	Returns distance transform computed by scipy.ndimage.distance_transform_cdt (two raster scans in C)
+	cdt measures distances to the nearest zero of its input and has no notion of obstacles, so it is only
+	equivalent to the geodesic transform when every element is foreground and boundaries are not periodic
+	'''
+	mask = np.ones(array_input.shape, dtype=bool)
+	mask[tuple(origenes.T)] = False	#origenes are the only zeros -> distances are measured from them
+	if dist_type == "city":
+		metric = "taxicab"
+	else:
+		metric = "chessboard"
+	return ndimage.distance_transform_cdt(mask, metric=metric).astype(np.float32)
+
+#end dist_scipy()
+
+
+
+def _dist2d (array_input, origenes, dist_type, periodic_boundaries):
 	'''
 	gdt works with an array where values:
 		-1: unactualized foreground
 		-2: background
-	An origin must be foreground, and only foreground actualizable values (-1) will be modified
+	Origenes must be foreground, and only foreground actualizable values (-1) will be modified
 	Once a value is modified with its corresponding distance (which is > -1) its value won't change
 	'''
-	array = np.where(array_input > 0, -1, -2)
-	if array[origin] != -1:
+	pesos = _PESOS_2D[dist_type]
+	offsets = _OFFSETS_2D[:len(pesos)]
+	array = _init_array(array_input)
+	if np.any(array[tuple(origenes.T)] != -1):
 		raise Exception ("Error: Chosen origin is not part of foreground")
-	else:
-		array[origin] = 0
-		origin += (0,)
-		lista_fuentes = [origin]
-	'''
-	Fuente: (x, y, value) element of the array whose distance is expanded to adyacent elements in an iterative process
-	Fuentes are stored in a list and iterations stop once list is empty
-	'''
-	while lista_fuentes != []:
-		next_lista_fuentes = []
-		if dist_type in ["borges", "quasi"]:
-			_order(lista_fuentes, 2)	#These dist_types require sorting the list according to their distance value
 
-		for fuente in lista_fuentes:
-			if dist_type == "city":
-				lista_adyacentes = _ady2d(fuente, array)
+	resuelto = False
+	if not np.any(array == -2):
+		if gdt_simd is not None and not periodic_boundaries and (dist_type in ["borges", "quasi"] or gdt_numba is None):
+			resuelto = gdt_simd.chamfer2d(array, origenes, pesos[::4])
+		#AVX2 raster scans, pesos[::4] are the 4-adyacent peso and the diagonal one (if any)
+		#For city / chess the numba wavefront is kept when available: one visit per element
+		elif dist_type in ["borges", "quasi"] and gdt_numba is not None:
+			resuelto = gdt_numba.chamfer2d(array, origenes, pesos[[0, 4]], periodic_boundaries)
+	#Scans only converge in a few passes without background, paths around background need one more scan for every
+	#turn against the scan order, so arrays with background go straight to the expansion below
+
+	if not resuelto:
+		if dist_type in ["borges", "quasi"]:
+			if gdt_numba is not None:
+				gdt_numba.dial2d(array, origenes, offsets, pesos, periodic_boundaries)
 			else:
-				lista_adyacentes = _ady2d(fuente, array, ady=8)
-			#Only cityblock uses 4-adyacent expansion, all other methods use 8-adyacent
-
-			for index, casilla in enumerate(lista_adyacentes):
-				if array[casilla] == -1:
-					if dist_type in ["city", "chess"]:
-						array[casilla] = fuente[2]+1
-					elif dist_type == "borges":
-						array[casilla] = fuente[2]+3+(index//4)	#3 is added to the four 1st ady elements (4-adyacents), while 4 is added to four last (8-adyacents exclusive points)
-					elif dist_type == "quasi":
-						array[casilla] = fuente[2]+5+(index//4)*2 #Idem but +5 and +7
-					else:
-						raise Exception ("Error: "+dist_type+" calculation method does not exist")
-					next_lista_fuentes.append(casilla + (array[casilla],))	#Values whose distance have been updated are added as next fuentes (including coordinates + distance_value)
-
-		lista_fuentes = next_lista_fuentes
-
-	array = np.where(array == -1, np.inf, array)
-	array = np.where(array == -2, np.inf, array)
-	#Values that have not been reached return inf distance, as well as background values
+				_dial(array, origenes, offsets, pesos, periodic_boundaries)
+		#Non-uniform pesos: the elements have to be actualized in order of distance, not of expansion wave
+		elif gdt_numba is not None:
+			gdt_numba.bfs2d(array, origenes, offsets, pesos[0], periodic_boundaries)
+		else:
+			_waves(array, origenes, offsets, pesos, periodic_boundaries)
 
-	return array
+	return _final_array(array)
 
 #end dist2d()
 
 
 
-def _ady2d (position, array, ady=4):
+def _init_array (array_input):
 	'''
-	Returns list of adyacent positions to input position
-		- ady: number of adyacency (4 or 8 adyacency)
+	Returns int32 working array of gdt (-1: unactualized foreground; -2: background)
+	Filled directly instead of through np.where temporaries, int32 halves memory traffic of int64
 	'''
-	SX, SY = array.shape
-	x, y, value = position
-	lista_adyacentes = []
-	lista_adyacentes.append(((x-1)%SX,(y)%SY))
-	lista_adyacentes.append(((x+1)%SX,(y)%SY))
-	lista_adyacentes.append(((x)%SX,(y-1)%SY))
-	lista_adyacentes.append(((x)%SX,(y+1)%SY))
-	#First 4 values added correspond to 4-adyacents
+	if gdt_numba is not None:
+		return gdt_numba.init_array(array_input)
+	#Single compiled pass, no boolean temporary
+	array = np.full(array_input.shape, -2, dtype=np.int32)
+	np.putmask(array, array_input > 0, -1)
+	return array
 
-	if ady == 8:
-		lista_adyacentes.append(((x-1)%SX,(y-1)%SY))
-		lista_adyacentes.append(((x-1)%SX,(y+1)%SY))
-		lista_adyacentes.append(((x+1)%SX,(y-1)%SY))
-		lista_adyacentes.append(((x+1)%SX,(y+1)%SY))
-		#Second 4 values added correspond to the extra 4 found in 8-adyacents
+#end init_array()
 
-	return lista_adyacentes
 
-#end ady2d()
 
+def _final_array (array):
+	'''
+	Returns float32 distances from working array
+	Values that have not been reached (-1) return inf distance, as well as background values (-2)
+	'''
+	if gdt_numba is not None:
+		return gdt_numba.final_array(array)
+	final = array.astype(np.float32)
+	final[array < 0] = np.inf
+	return final
 
+#end final_array()
 
-def optim2d (array_input, lista_posiciones):
-	'''
-	Returns array reduced to exactly fit list of coordinates
-	Also modifies input lista_posiciones to contain corresponding coordinates for new array
 
-	Input:
-		- array_input: numpy binary array (1 - foreground; 0 - background)
-		- lista_coordenadas: list containing lists of (x,y) coordinates
+
+def _waves (array, origenes, offsets, pesos, periodic):
 	'''
-	xmax = max([posicion[0] for posicion in lista_posiciones])
-	xmin = min([posicion[0] for posicion in lista_posiciones])
-	ymax = max([posicion[1] for posicion in lista_posiciones])
-	ymin = min([posicion[1] for posicion in lista_posiciones])
-	#maximum and minimum values for each coordinate
-
-	nueva_lista_posiciones = []
-	for posicion in lista_posiciones:
-		nueva_lista_posiciones.append((posicion[0]-xmin, posicion[1]-ymin))
-		#new coordinates in the reduced array correspond to previous coordinates - its minimum value
-	lista_posiciones[:] = nueva_lista_posiciones
-	#input list is modified in place -> replaced by new list
+	Fills array in place with distances to the nearest of origenes ((n_origenes, ndim) coordinates) expanding waves of fuentes, for uniform pesos (city, chess)
+	Fuentes: elements whose distance is expanded to adyacent elements, held as an array of flat positions plus
+	one of distance values
+	Each iteration expands the whole wave of fuentes at once and iterations stop once the wave is empty
+	'''
+	saltos = _saltos(array.shape, offsets)
+	fuentes = np.unique(np.ravel_multi_index(tuple(origenes.T), array.shape))
+	array.reshape(-1)[fuentes] = 0
+	valores = np.zeros(len(fuentes), dtype=np.int32)
+	#Every origen is a fuente of the first wave
+	while len(valores) > 0:
+		casillas, validas = _ady(fuentes, array.shape, offsets, saltos, periodic)
+		valores = (valores[:, None] + pesos)[validas]
+		#Row i holds the adyacents of fuente i and their distance through it
 
-	return array_input[xmin:xmax+1, ymin:ymax+1]
+		fuentes, valores = _expand(array, casillas[validas], valores)
+		#Values whose distance have been updated are the next fuentes
 
-#end optim2d
+#end waves()
 
 
 
-def _order (lista,dim):
+def _dial (array, origenes, offsets, pesos, periodic):
+	'''
+	Fills array in place with distances to the nearest of origenes ((n_origenes, ndim) coordinates) by Dial's algorithm (bucket queue), for non-uniform pesos
+	Bucket d holds elements reached with distance d (flat positions), all of them are actualized at once when d is
+	reached (pesos are positive, so elements of a bucket cannot improve each other) and their adyacents are pushed
+	to buckets d + peso
+	Only max(pesos) + 1 buckets are pending at any time, kept in a ring indexed by d % len(anillo)
+	'''
+	plano = array.reshape(-1)	#view of array, indexed by flat positions
+	saltos = _saltos(array.shape, offsets)
+	grupos = [(int(peso), pesos == peso) for peso in np.unique(pesos)]
+	anillo = [[] for _ in range(int(pesos.max()) + 1)]
+	anillo[0].append(np.ravel_multi_index(tuple(origenes.T), array.shape))
+	pendientes = 1	#arrays of positions held by the buckets
+
+	d = 0
+	while pendientes > 0:
+		cubo = anillo[d % len(anillo)]
+		if cubo:
+			pendientes -= len(cubo)
+			indices = np.unique(np.concatenate(cubo))
+			cubo.clear()
+			indices = indices[plano[indices] == -1]	#elements already actualized with a lower distance are dropped
+			plano[indices] = d
+
+			casillas, validas = _ady(indices, array.shape, offsets, saltos, periodic)
+			for peso, columnas in grupos:
+				siguientes = casillas[:, columnas][validas[:, columnas]]
+				siguientes = siguientes[plano[siguientes] == -1]
+				if len(siguientes) > 0:
+					anillo[(d + peso) % len(anillo)].append(siguientes)
+					pendientes += 1
+		d += 1
+
+#end dial()
+
+
+
+def _saltos (shape, offsets):
 	'''
-	Function that orders a list by its dimth element
+	Returns flat offset of each adyacent (offsets dotted with the strides, in elements, of an array of shape)
+	Invariant for a whole transform, computed once by _waves() / _dial() instead of on every wave
 	'''
-	lista.sort(key=lambda x: x[dim])
-	return lista
+	pasos = np.array([int(np.prod(shape[d+1:])) for d in range(len(shape))])
+	return offsets @ pasos
 
-#end order
+#end saltos()
 
 
 
-def _dist3d (array_input, origin, dist_type, periodic_boundaries):
+def _ady (fuentes, shape, offsets, saltos, periodic):
+	'''
+	Returns flat positions of the adyacents of every fuente (flat positions) as an (n_fuentes, n_offsets) array,
+	plus an (n_fuentes, n_offsets) boolean array marking which of them lie inside the array (all of them if periodic)
+		- offsets: (n_offsets, ndim) displacement of each adyacent, e.g. _OFFSETS_2D[:4] for 4-adyacency
+		- saltos: flat offsets of the same adyacents, from _saltos()
+	Away from the faces of the array an adyacent is the fuente plus a fixed flat offset (one add per adyacent),
+	only fuentes on a face go through their coordinates to be wrapped or discarded
+	'''
+	casillas = fuentes[:, None] + saltos
+	validas = np.ones(casillas.shape, dtype=bool)
 
-	#See comments for 2D method, most code is analogous
-	array = np.where(array_input > 0, -1, -2)
-	if array[origin] != -1:
-		raise Exception ("Error: Chosen origin is not part of foreground")
-	else:
-		array[origin] = 0
-		origin += (0,)
-		lista_fuentes = [origin]
+	coordenadas = np.unravel_index(fuentes, shape)
+	borde = np.zeros(len(fuentes), dtype=bool)
+	for c, S in zip(coordenadas, shape):
+		borde |= (c == 0) | (c == S - 1)
+	if borde.any():
+		vecinas = tuple(c[borde, None] + offsets[:, d] for d, c in enumerate(coordenadas))
+		casillas[borde] = np.ravel_multi_index(vecinas, shape, mode="wrap")
+		if not periodic:
+			dentro = np.ones(vecinas[0].shape, dtype=bool)
+			for c, S in zip(vecinas, shape):
+				dentro &= (c >= 0) & (c < S)
+			validas[borde] = dentro
+	#Offsets are at most 1 element, so only fuentes with a coordinate at 0 or S-1 may leave the array
+	return casillas, validas
 
-	while lista_fuentes != []:
-		next_lista_fuentes = []
-		if dist_type in ["borges", "quasi"]:
-			_order(lista_fuentes, 3)
+#end ady()
 
-		for fuente in lista_fuentes:
-			if dist_type in ["chess", "borges", "quasi"]:
-				lista_adyacentes = _ady3d(fuente, array, ady=26)
-			else:
-				lista_adyacentes = _ady3d(fuente, array)
-
-			for index, casilla in enumerate(lista_adyacentes):
-				if array[casilla] == -1:
-
-					if dist_type in ["city", "chess"]:
-						array[casilla] = fuente[3]+1
-
-					elif dist_type == "borges":
-						'''
-						In 3D borges and quasi different values are assigned to:
-							1st-6th elements (single-displacement)
-							7th-18th elements (double-displacement)
-							19th - 26th elements (triple-displacement)
-						'''
-						if index < 6:
-							array[casilla] = fuente[3]+3
-						elif index < 18:
-							array[casilla] = fuente[3]+4
-						else:
-							array[casilla] = fuente[3]+5
-
-					elif dist_type == "quasi":
-						if index < 6:
-							array[casilla] = fuente[3]+10
-						elif index < 18:
-							array[casilla] = fuente[3]+14
-						else:
-							array[casilla] = fuente[3]+17
-
-					else:
-						raise Exception ("Error: "+dist_type+" calculation method does not exist")
-
-					next_lista_fuentes.append(casilla + (array[casilla],))
-
-		lista_fuentes = next_lista_fuentes
-
-	array = np.where(array == -1, np.inf, array)
-	array = np.where(array == -2, np.inf, array)
 
-	return array
 
-#end dist3d()
+def _expand (array, casillas, valores):
+	'''
+	Actualizes array with valores at casillas (flat positions, in expansion order) and returns next fuentes as
+	(casillas, valores)
+	Only unactualized foreground (-1) is modified, and a casilla repeated in the wave keeps its first value,
+	same result as actualizing casillas one at a time
+	Next fuentes are returned sorted by flat position, so the scatter here and the gathers of the next wave walk
+	the array in memory order instead of jumping between distant rows
+	'''
+	plano = array.reshape(-1)	#view of array, indexed by flat positions
+	libres = plano[casillas] == -1
+	indices = casillas[libres]
+	valores = valores[libres]
+
+	indices, primeras = np.unique(indices, return_index=True)
+	valores = valores[primeras]
+	#Sorted positions and the value of their first appearance, order within a wave does not change distances
 
+	plano[indices] = valores
+	return indices, valores
 
+#end expand()
 
-def _ady3d (position, array, ady=6):
+
+
+def optim2d (array_input, lista_posiciones):
 	'''
-	Returns list of adyacent positions to input position
-		- ady: number of adyacency (6 or 26 adyacency)
+	Returns array reduced to exactly fit list of coordinates
+	Also modifies input lista_posiciones to contain corresponding coordinates for new array
+
+	Input:
+		- array_input: numpy binary array (1 - foreground; 0 - background)
+		- lista_coordenadas: list containing lists of (x,y) coordinates
 	'''
-	SX, SY, SZ = array.shape
-	x, y, z, value = position
-	lista_adyacentes = []
-	lista_adyacentes.append(((x-1)%SX,(y)%SY,(z)%SZ))
-	lista_adyacentes.append(((x+1)%SX,(y)%SY,(z)%SZ))
-	lista_adyacentes.append(((x)%SX,(y-1)%SY,(z)%SZ))
-	lista_adyacentes.append(((x)%SX,(y+1)%SY,(z)%SZ))
-	lista_adyacentes.append(((x)%SX,(y)%SY,(z-1)%SZ))
-	lista_adyacentes.append(((x)%SX,(y)%SY,(z+1)%SZ))
-	#1st-6th elements: single-displacement
+	return optim(array_input, lista_posiciones)
 
-	if ady == 26:
+#end optim2d
 
-		lista_adyacentes.append(((x-1)%SX,(y-1)%SY,(z)%SZ))
-		lista_adyacentes.append(((x-1)%SX,(y+1)%SY,(z)%SZ))
-		lista_adyacentes.append(((x+1)%SX,(y-1)%SY,(z)%SZ))
-		lista_adyacentes.append(((x+1)%SX,(y+1)%SY,(z)%SZ))
-		lista_adyacentes.append(((x-1)%SX,(y)%SY,(z-1)%SZ))
-		lista_adyacentes.append(((x-1)%SX,(y)%SY,(z+1)%SZ))
-		lista_adyacentes.append(((x+1)%SX,(y)%SY,(z-1)%SZ))
-		lista_adyacentes.append(((x+1)%SX,(y)%SY,(z+1)%SZ))
-		lista_adyacentes.append(((x)%SX,(y-1)%SY,(z-1)%SZ))
-		lista_adyacentes.append(((x)%SX,(y-1)%SY,(z+1)%SZ))
-		lista_adyacentes.append(((x)%SX,(y+1)%SY,(z-1)%SZ))
-		lista_adyacentes.append(((x)%SX,(y+1)%SY,(z+1)%SZ))
-		#6th-18th elements: double-displacement
 
-		lista_adyacentes.append(((x-1)%SX,(y-1)%SY,(z-1)%SZ))
-		lista_adyacentes.append(((x-1)%SX,(y-1)%SY,(z+1)%SZ))
-		lista_adyacentes.append(((x+1)%SX,(y-1)%SY,(z+1)%SZ))
-		lista_adyacentes.append(((x+1)%SX,(y-1)%SY,(z-1)%SZ))
-		lista_adyacentes.append(((x-1)%SX,(y+1)%SY,(z+1)%SZ))
-		lista_adyacentes.append(((x-1)%SX,(y+1)%SY,(z-1)%SZ))
-		lista_adyacentes.append(((x-1)%SX,(y-1)%SY,(z+1)%SZ))
-		lista_adyacentes.append(((x-1)%SX,(y-1)%SY,(z-1)%SZ))
-		#18th-26th elements: triple-displacement
 
-	return lista_adyacentes
+def _dist3d (array_input, origenes, dist_type, periodic_boundaries):
 
-#end ady3d()
+	#See comments for 2D method, most code is analogous
+	#No raster scans: 3D Dial's algorithm is faster than the 26-adyacents chamfer even without background
+	pesos = _PESOS_3D[dist_type]
+	offsets = _OFFSETS_3D[:len(pesos)]
+	array = _init_array(array_input)
+	if np.any(array[tuple(origenes.T)] != -1):
+		raise Exception ("Error: Chosen origin is not part of foreground")
+
+	if dist_type in ["borges", "quasi"]:
+		if gdt_numba is not None:
+			gdt_numba.dial3d(array, origenes, offsets, pesos, periodic_boundaries)
+		else:
+			_dial(array, origenes, offsets, pesos, periodic_boundaries)
+	elif gdt_numba is not None:
+		gdt_numba.bfs3d(array, origenes, offsets, pesos[0], periodic_boundaries)
+	else:
+		_waves(array, origenes, offsets, pesos, periodic_boundaries)
+
+	return _final_array(array)
+
+#end dist3d()
 
 
 
@@ -300,22 +436,35 @@ def optim3d (array_input, lista_posiciones):
 		- array_input: numpy int array with values 1 = foreground; 0 = background
 		- lista_coordenadas: list containing lists of (x,y,z) coordinates
 	'''
-	#See coments for optim2d(), analogous code
-	xmax = max([posicion[0] for posicion in lista_posiciones])
-	xmin = min([posicion[0] for posicion in lista_posiciones])
-	ymax = max([posicion[1] for posicion in lista_posiciones])
-	ymin = min([posicion[1] for posicion in lista_posiciones])
-	zmax = max([posicion[2] for posicion in lista_posiciones])
-	zmin = min([posicion[2] for posicion in lista_posiciones])
+	return optim(array_input, lista_posiciones)
 
-	nueva_lista_posiciones = []
-	for posicion in lista_posiciones:
-		nueva_lista_posiciones.append((posicion[0]-xmin, posicion[1]-ymin, posicion[2]-zmin))
-	lista_posiciones[:] = nueva_lista_posiciones
+#end optim3d
 
-	return array_input[xmin:xmax+1, ymin:ymax+1, zmin:zmax+1]
 
-#end optim3d
+
+def optim (array_input, lista_posiciones):
+	'''
+	Returns array reduced to exactly fit list of coordinates, 2D or 3D (optim2d() and optim3d() call it)
+	Also modifies input lista_posiciones to contain corresponding coordinates for new array
+
+	Input:
+		- array_input: numpy binary array (1 - foreground; 0 - background)
+		- lista_coordenadas: list containing lists of coordinates, as many per position as array dimensions
+	'''
+	posiciones = np.asarray(lista_posiciones, dtype=np.int32)
+	if posiciones.ndim != 2 or posiciones.shape[1] != array_input.ndim:
+		raise Exception ("Error: Coordinates do not match array dimensions")
+	minimos = posiciones.min(axis=0)
+	maximos = posiciones.max(axis=0)
+	#maximum and minimum values for each coordinate, in one pass over the array of positions
+
+	lista_posiciones[:] = [tuple(posicion) for posicion in (posiciones - minimos).tolist()]
+	#new coordinates in the reduced array correspond to previous coordinates - its minimum value
+	#input list is modified in place -> replaced by new list
+
+	return array_input[tuple(slice(minimo, maximo+1) for minimo, maximo in zip(minimos, maximos))]
+
+#end optim
 
 
 
@@ -332,12 +481,20 @@ def form3d (numero, formato):
 	Output: Numpy array with required format for gdt.dist()
 	'''
 	ruta = input("Ruta de las imagenes: ")
-	array = []
-	for i in range(numero):
-		imagen_temp = Image.open(ruta+"/"+str(i)+str(formato))
-		imagen_temp = np.asarray(imagen_temp)
-		imagen_temp = np.where(imagen_temp > 0, 0, 1)
-		array.append(imagen_temp)
-	return np.array(array)
+	if numero <= 0:
+		return np.empty((0,), dtype=np.uint8)
+	#No slices to import, slice 0 gives the shape of all the others so it is only opened when there are slices
+	primera = np.asarray(Image.open(ruta+"/0"+str(formato)))
+	array = np.empty((numero,) + primera.shape, dtype=np.uint8)
+	#Slices are decoded straight into the 3D array, no list of 2D arrays to be copied again at the end
+	array[0] = primera == 0
+
+	def _slice (i):
+		array[i] = np.asarray(Image.open(ruta+"/"+str(i)+str(formato))) == 0
+
+	with ThreadPoolExecutor() as pool:
+		list(pool.map(_slice, range(1, numero)))
+	#PIL releases the GIL while decoding, so slices are read and decoded concurrently
+	return array
 
 #end form3d
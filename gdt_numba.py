@@ -0,0 +1,481 @@
+'''
+Module - gdt_numba
+-----------------------------
+Numba compiled kernels used by gdt.dist() when numba is installed
+
+Same wavefront expansion as _dist2d() / _dist3d() for city and chess, but the iterations run as native code:
+	- fuentes are stored in flat preallocated buffers (packed coordinates + int32 distance) instead of lists of tuples
+	- each wave is split in blocks expanded in parallel (one per numba thread), then compacted into the next wave
+	- adyacents are the offsets tables of gdt (e.g. _OFFSETS_2D), their distance increment the single peso of the metric
+
+borges and quasi pesos are small integers, so they are solved by Dial's algorithm (a ring of buckets indexed by
+distance, the same as gdt._dial() but element by element)
+2D arrays without background can also be solved by the two raster scans chamfer (Rosenfeld-Pfaltz / Borgefors):
+	- forward scan applies the half of the mask preceding each element, backward scan the other half
+	- scans are repeated until they stop changing values, which gives the weighted geodesic distance
+	  (a few scans without background, also for periodic boundaries)
+
+Kernels work in place over the working array of gdt (-1: unactualized foreground; -2: background)
+
+'''
+
+import numpy as np
+from numba import get_num_threads, literally, njit, prange
+
+
+_MASCARA_2D = np.array([[0, -1], [-1, -1], [-1, 0], [-1, 1]], dtype=np.int32)
+#Half mask preceding an element in raster order, backward scan uses the opposite offsets
+
+_DESPLAZAMIENTOS_2D = np.count_nonzero(_MASCARA_2D, axis=1) - 1
+#Weight of each mask element depends on its number of displacements (0: single, 1: double)
+
+_CAPACIDAD = 1024	#initial number of fuentes held by wavefront buffers
+_BLOQUE_DIAL = 256	#bucket entries actualized between two capacity checks of the Dial buckets
+_MIN_BLOQUE = 64	#fuentes per thread below which a wave is expanded serially (launching threads costs more)
+
+_INF = 2**30	#distance of unactualized foreground during the scans
+
+_LIMITE_SCANS_2D = 16
+#Scans done before leaving the chamfer for Dial's algorithm, arrays without background need at most 4
+
+_TIPOS_ENTRADA = tuple(np.dtype(tipo) for tipo in ("bool", "uint8", "int32", "int64", "float32", "float64"))
+#Native byte order dtypes of array_input given to the init_array() kernel (compiled at their first use), others
+#(including byte swapped ones, which numba cannot type) are converted to bool first
+
+
+
+@njit(cache=True, boundscheck=False)
+def _wrap (c, S, periodic):
+	'''
+	Returns coordinate c (at most 1 outside [0, S)) wrapped into the array, or -1 if outside and not periodic
+	'''
+	if c < 0:
+		if periodic:
+			return S-1
+		return -1
+	if c >= S:
+		if periodic:
+			return 0
+		return -1
+	return c
+
+#end wrap()
+
+
+
+def bfs2d (array, origenes, offsets, peso, periodic):
+	'''
+	Fills array in place with distances to the nearest of origenes ((n_origenes, 2) coordinates), see bfs3d()
+	Runs the 3D kernel over the array seen as a single x slice
+	'''
+	offsets3d = np.zeros((len(offsets), 3), dtype=np.int32)
+	offsets3d[:, 1:] = offsets
+	origenes3d = np.zeros((len(origenes), 3), dtype=np.int64)
+	origenes3d[:, 1:] = origenes
+	bfs3d(array[None], origenes3d, offsets3d, peso, periodic)
+
+#end bfs2d()
+
+
+
+def bfs3d (array, origenes, offsets, peso, periodic):
+	'''
+	Fills array in place with distances to the nearest of origenes ((n_origenes, 3) coordinates, all of them
+	unactualized foreground) expanding through offsets adyacents, each one adding peso
+	Every origen is a fuente of the first wave, so many origenes cost a single expansion
+	Only for uniform pesos (city, chess), so the distance of a wave is computed once per fuente, not per adyacent
+	Two threads may actualize the same adyacent at once, but both write the same value
+	(a repeated fuente in next wave finds its adyacents already actualized and adds nothing)
+	Coordinates of fuentes are packed in a single integer with (x, y, z) bit fields sized from array.shape,
+	an uint32 whenever they fit (any array up to 2**32 elements with power of 2 sides)
+	'''
+	bits = [max(1, int(S-1).bit_length()) for S in array.shape]
+	codigo = np.uint32 if sum(bits) <= 32 else np.int64
+	_bfs3d(array, origenes, offsets, peso, periodic, bits[1], bits[2], codigo, get_num_threads())
+
+#end bfs3d()
+
+
+
+@njit(cache=True, boundscheck=False)
+def _wave3d (array, codigos, valores, inicio, fin, offsets, peso, periodic, by, bz, salida_codigos, salida_valores, base):
+	'''
+	Expands fuentes inicio to fin and writes the actualized adyacents (next fuentes) into salida buffers from base
+	Fuentes are codigo packed coordinates, x << (by+bz) | y << bz | z, plus a parallel int32 buffer of distance
+	values (8 bytes per fuente with uint32 codigos)
+	Returns number of next fuentes written
+	'''
+	SX, SY, SZ = array.shape
+	my, mz = (1 << by) - 1, (1 << bz) - 1
+	n = 0
+	for i in range(inicio, fin):
+		c = np.int64(codigos[i])
+		x, y, z = c >> (by+bz), (c >> bz) & my, c & mz
+		value = valores[i] + peso
+		for k in range(len(offsets)):
+			cx = _wrap(x + offsets[k, 0], SX, periodic)
+			cy = _wrap(y + offsets[k, 1], SY, periodic)
+			cz = _wrap(z + offsets[k, 2], SZ, periodic)
+			if cx < 0 or cy < 0 or cz < 0:
+				continue
+			if array[cx, cy, cz] == -1:
+				array[cx, cy, cz] = value
+				salida_codigos[base+n] = (np.int64(cx) << (by+bz)) | (np.int64(cy) << bz) | np.int64(cz)
+				salida_valores[base+n] = value
+				n += 1
+	return n
+
+#end wave3d()
+
+
+
+@njit(cache=True, parallel=True, boundscheck=False)
+def _parallel_wave3d (array, codigos, valores, n_fuentes, offsets, peso, periodic, by, bz,
+		candidatas_codigos, candidatas_valores, cuentas):
+	'''
+	Expands a whole wave splitting fuentes in len(cuentas) blocks run in parallel
+	Block b writes its next fuentes into its own region of the candidatas buffers (from b*tam*len(offsets))
+	and their number into cuentas[b], so blocks never share output positions
+	Returns tam, the number of fuentes per block
+	'''
+	n_bloques = len(cuentas)
+	tam = (n_fuentes + n_bloques - 1) // n_bloques
+	for b in prange(n_bloques):
+		inicio = min(b*tam, n_fuentes)
+		fin = min(inicio + tam, n_fuentes)
+		cuentas[b] = _wave3d(array, codigos, valores, inicio, fin, offsets, peso, periodic, by, bz,
+			candidatas_codigos, candidatas_valores, b*tam*len(offsets))
+	return tam
+
+#end parallel_wave3d()
+
+
+
+@njit(cache=True, parallel=True, boundscheck=False)
+def _bfs3d (array, origenes, offsets, peso, periodic, by, bz, codigo, n_bloques):
+	'''
+	Kernel of bfs3d(), each wave is expanded in n_bloques parallel blocks
+	Waves smaller than _MIN_BLOQUE fuentes per block (narrow corridors give one wave per step of 1-2 fuentes)
+	are expanded by a single serial call, whose output buffers become the next wave without compaction
+	'''
+	K = len(offsets)
+	n_fuentes = len(origenes)
+	cuentas = np.empty(n_bloques, dtype=np.int64)
+	codigos = np.empty(max(_CAPACIDAD, n_fuentes), dtype=codigo)
+	valores = np.empty(max(_CAPACIDAD, n_fuentes), dtype=np.int32)
+	candidatas_codigos = np.empty(_CAPACIDAD, dtype=codigo)
+	candidatas_valores = np.empty(_CAPACIDAD, dtype=np.int32)
+	#Buffers are reallocated when a wave does not fit, memory follows the largest wave, not the array size
+
+	for i in range(n_fuentes):
+		x0, y0, z0 = origenes[i, 0], origenes[i, 1], origenes[i, 2]
+		array[x0, y0, z0] = 0
+		codigos[i] = (np.int64(x0) << (by+bz)) | (np.int64(y0) << bz) | np.int64(z0)
+		valores[i] = 0
+
+	while n_fuentes > 0:
+		if len(candidatas_codigos) < (n_fuentes + len(cuentas)) * K:
+			candidatas_codigos = np.empty(2 * (n_fuentes + len(cuentas)) * K, dtype=codigo)
+			candidatas_valores = np.empty(2 * (n_fuentes + len(cuentas)) * K, dtype=np.int32)
+		if n_fuentes < _MIN_BLOQUE * len(cuentas):
+			n_fuentes = _wave3d(array, codigos, valores, 0, n_fuentes, offsets, peso, periodic, by, bz,
+				candidatas_codigos, candidatas_valores, 0)
+			codigos, candidatas_codigos = candidatas_codigos, codigos
+			valores, candidatas_valores = candidatas_valores, valores
+			continue
+		tam = _parallel_wave3d(array, codigos, valores, n_fuentes, offsets, peso, periodic, by, bz,
+			candidatas_codigos, candidatas_valores, cuentas)
+
+		n_fuentes = cuentas.sum()
+		if len(codigos) < n_fuentes:
+			codigos = np.empty(2 * n_fuentes, dtype=codigo)
+			valores = np.empty(2 * n_fuentes, dtype=np.int32)
+		n = 0
+		for b in range(len(cuentas)):
+			codigos[n:n+cuentas[b]] = candidatas_codigos[b*tam*K:b*tam*K+cuentas[b]]
+			valores[n:n+cuentas[b]] = candidatas_valores[b*tam*K:b*tam*K+cuentas[b]]
+			n += cuentas[b]
+		#Regions of candidatas are compacted into the next wave
+
+#end _bfs3d()
+
+
+
+@njit(cache=True, boundscheck=False)
+def _scan2d (array, pesos, periodic, sentido):
+	'''
+	Raster scan over array, forward (sentido = 1) or backward (sentido = -1)
+	Every foreground element takes the minimum of its value and each half mask element + its weight
+	Unactualized foreground (-1) is read as _INF, so it keeps -1 if no distance reaches it and the array
+	never needs a conversion pass before or after the scans
+	Returns whether any value changed
+	'''
+	SX, SY = array.shape
+	cambios = False
+	for i in range(SX):
+		x = i if sentido > 0 else SX-1-i
+		for j in range(SY):
+			y = j if sentido > 0 else SY-1-j
+			d = array[x, y]
+			if d == -2:
+				continue
+			actual = d if d >= 0 else _INF
+			d = actual
+			for k in range(len(_MASCARA_2D)):
+				cx = _wrap(x + sentido*_MASCARA_2D[k, 0], SX, periodic)
+				cy = _wrap(y + sentido*_MASCARA_2D[k, 1], SY, periodic)
+				if cx < 0 or cy < 0:
+					continue
+				value = array[cx, cy]
+				if value >= 0 and value + pesos[k] < d:
+					d = value + pesos[k]
+			if d < actual:
+				array[x, y] = d
+				cambios = True
+	return cambios
+
+#end scan2d()
+
+
+
+@njit(cache=True, boundscheck=False)
+def _stable (cambios, estado, periodic):
+	'''
+	Returns whether the chamfer scans can stop after a scan that changed (cambios) or not any value
+	estado holds [consecutive scans without changes, scans done] and is updated in place
+	Without periodic boundaries each scan leaves its half of the mask satisfied, so the first scan without
+	changes ends the loop; with periodic boundaries wrapped elements are visited out of order and two
+	consecutive scans without changes are required
+	'''
+	if cambios:
+		estado[0] = 0
+	else:
+		estado[0] += 1
+	estado[1] += 1
+	objetivo = 2 if periodic else 1
+	return estado[0] >= objetivo and estado[1] >= 2
+
+#end stable()
+
+
+
+@njit(cache=True, boundscheck=False)
+def _reset (plano):
+	'''
+	Sets every distance of plano (flat view of the working array) back to unactualized foreground
+	'''
+	for i in range(len(plano)):
+		if plano[i] >= 0:
+			plano[i] = -1
+
+#end reset()
+
+
+
+@njit(cache=True, boundscheck=False)
+def chamfer2d (array, origenes, pesos, periodic):
+	'''
+	Fills array in place with distances to the nearest of origenes ((n_origenes, 2) coordinates) for the chamfer
+	whose pesos are (single, double)-displacement weights
+	origenes must be unactualized foreground
+	Returns False, with array back to unactualized, if scans do not converge within _LIMITE_SCANS_2D
+	'''
+	pesos = pesos[_DESPLAZAMIENTOS_2D]
+	for i in range(len(origenes)):
+		array[origenes[i, 0], origenes[i, 1]] = 0
+	estado = np.zeros(2, dtype=np.int32)
+	sentido = 1
+	while not _stable(_scan2d(array, pesos, literally(periodic), sentido), estado, periodic):
+		sentido = -sentido	#forward and backward scans alternate
+		if estado[1] == _LIMITE_SCANS_2D:
+			_reset(array.reshape(-1))
+			return False
+	#literally(): scans are compiled apart for periodic and non-periodic boundaries, so the _wrap() branches
+	#of the other case are removed from the mask loop
+	return True
+
+#end chamfer2d()
+
+
+
+def dial2d (array, origenes, offsets, pesos, periodic):
+	'''
+	Fills array in place with distances to the nearest of origenes ((n_origenes, 2) coordinates), see dial3d()
+	'''
+	offsets3d = np.zeros((len(offsets), 3), dtype=np.int32)
+	offsets3d[:, 1:] = offsets
+	origenes3d = np.zeros((len(origenes), 3), dtype=np.int64)
+	origenes3d[:, 1:] = origenes
+	dial3d(array[None], origenes3d, offsets3d, pesos, periodic)
+
+#end dial2d()
+
+
+
+def dial3d (array, origenes, offsets, pesos, periodic):
+	'''
+	Fills array in place with distances to the nearest of origenes ((n_origenes, 3) coordinates) through offsets
+	adyacents, each one adding its pesos value, by Dial's algorithm (same bucket ring as gdt._dial(), with the
+	packed coordinates of bfs3d())
+	origenes must be unactualized foreground, all of them start in bucket 0
+	'''
+	bits = [max(1, int(S-1).bit_length()) for S in array.shape]
+	codigo = np.uint32 if sum(bits) <= 32 else np.int64
+	_dial3d(array, origenes, offsets, pesos, periodic, bits[1], bits[2], codigo)
+
+#end dial3d()
+
+
+
+@njit(cache=True, boundscheck=False)
+def _dial3d (array, origenes, offsets, pesos, periodic, by, bz, codigo):
+	'''
+	Kernel of dial3d()
+	Bucket d % R (R = max(pesos) + 1) holds the elements reached with tentative distance d, only distances d to
+	d + max(pesos) are pending at any time so R buckets are enough; they are the rows of cubos
+	While in a bucket, elements hold -(tentative distance + 3) in array (below -2, so distinguishable from
+	unactualized foreground and background): an adyacent is only pushed when it improves its tentative distance,
+	and entries whose distance is no longer the tentative one are skipped when their bucket is reached
+	Buckets are emptied _BLOQUE_DIAL entries at a time by _dial_block(), cubos is grown between blocks so that
+	every row has room for all the adyacents of a block (growing it inside the loop over adyacents keeps numba
+	from holding the buffers in registers, about 10 times slower)
+	'''
+	SX, SY, SZ = array.shape
+	K = len(offsets)
+	saltos = np.empty(K, dtype=np.int64)
+	desplazamientos = np.empty(K, dtype=np.int64)
+	for k in range(K):
+		saltos[k] = (offsets[k, 0]*SY + offsets[k, 1])*SZ + offsets[k, 2]
+		desplazamientos[k] = (np.int64(offsets[k, 0]) << (by+bz)) + (np.int64(offsets[k, 1]) << bz) + offsets[k, 2]
+	#Flat position and packed coordinates offsets of each adyacent, valid off the faces of the array
+	R = pesos.max() + 1
+	cuentas = np.zeros(R, dtype=np.int64)
+	cubos = np.empty((R, max(_CAPACIDAD, len(origenes))), dtype=codigo)
+
+	for i in range(len(origenes)):
+		x0, y0, z0 = origenes[i, 0], origenes[i, 1], origenes[i, 2]
+		cubos[0, i] = (np.int64(x0) << (by+bz)) | (np.int64(y0) << bz) | np.int64(z0)
+		array[x0, y0, z0] = -3
+	cuentas[0] = len(origenes)
+	pendientes = len(origenes)	#entries held by the buckets
+
+	d = 0
+	r = 0	#d % R
+	while pendientes > 0:
+		inicio = 0
+		while inicio < cuentas[r]:
+			fin = min(inicio + _BLOQUE_DIAL, cuentas[r])
+			necesarias = cuentas.max() + (fin - inicio) * K
+			if necesarias > cubos.shape[1]:
+				mayor = np.empty((R, max(necesarias, 2 * cubos.shape[1])), dtype=codigo)
+				mayor[:, :cubos.shape[1]] = cubos
+				cubos = mayor
+			pendientes += _dial_block(array.reshape(-1), array.shape, cubos, cuentas, r, inicio, fin, d,
+				offsets, saltos, desplazamientos, pesos, periodic, by, bz)
+			inicio = fin
+		#pesos are >= 1, so bucket r receives no entries while it is being emptied
+		pendientes -= cuentas[r]
+		cuentas[r] = 0
+		d += 1
+		r = r + 1 if r + 1 < R else 0
+
+#end _dial3d()
+
+
+
+@njit(cache=True, boundscheck=False)
+def _dial_block (plano, shape, cubos, cuentas, r, inicio, fin, d, offsets, saltos, desplazamientos, pesos, periodic,
+		by, bz):
+	'''
+	Actualizes entries inicio to fin of bucket r (distance d) and pushes their improved adyacents, see _dial3d()
+	Adyacents of elements off the faces of the array are found adding saltos to the flat position and
+	desplazamientos to the packed coordinates, only elements on a face are unpacked and wrapped
+	Returns the number of entries pushed
+	'''
+	SX, SY, SZ = shape
+	my, mz = (1 << by) - 1, (1 << bz) - 1
+	R = len(cuentas)
+	n = 0
+	for i in range(inicio, fin):
+		c = np.int64(cubos[r, i])
+		x, y, z = c >> (by+bz), (c >> bz) & my, c & mz
+		p = (x*SY + y)*SZ + z
+		if plano[p] != -(d + 3):
+			continue	#stale entry (or a repeated origen), the element was reached with a lower distance
+		plano[p] = d
+		interior = 0 < x < SX-1 and 0 < y < SY-1 and 0 < z < SZ-1
+
+		for k in range(len(offsets)):
+			if interior:
+				cp, cc = p + saltos[k], c + desplazamientos[k]
+			else:
+				cx = _wrap(x + offsets[k, 0], SX, periodic)
+				cy = _wrap(y + offsets[k, 1], SY, periodic)
+				cz = _wrap(z + offsets[k, 2], SZ, periodic)
+				if cx < 0 or cy < 0 or cz < 0:
+					continue
+				cp = (cx*SY + cy)*SZ + cz
+				cc = (np.int64(cx) << (by+bz)) | (np.int64(cy) << bz) | np.int64(cz)
+			actual = plano[cp]
+			nuevo = d + pesos[k]
+			if actual == -1 or (actual < -2 and nuevo < -actual - 3):
+				plano[cp] = -(nuevo + 3)
+				q = r + pesos[k]
+				if q >= R:
+					q -= R
+				cubos[q, cuentas[q]] = cc
+				cuentas[q] += 1
+				n += 1
+	return n
+
+#end dial_block()
+
+
+
+def init_array (array_input):
+	'''
+	Returns int32 working array of array_input (-1: unactualized foreground; -2: background) in a single pass
+	'''
+	if not (array_input.dtype.isnative and array_input.dtype in _TIPOS_ENTRADA):
+		array_input = array_input > 0
+	array = np.empty(array_input.shape, dtype=np.int32)
+	_init(np.ascontiguousarray(array_input).reshape(-1), array.reshape(-1))
+	return array
+
+#end init_array()
+
+
+
+@njit(cache=True, parallel=True, boundscheck=False)
+def _init (entrada, plano):
+	'''
+	Kernel of init_array() over flat views of input and working array
+	'''
+	for i in prange(len(entrada)):
+		plano[i] = -1 if entrada[i] > 0 else -2
+
+#end init()
+
+
+
+def final_array (array):
+	'''
+	Returns float32 distances from working array in a single pass, inf for unreached foreground and background
+	'''
+	final = np.empty(array.shape, dtype=np.float32)
+	_final(array.reshape(-1), final.reshape(-1))
+	return final
+
+#end final_array()
+
+
+
+@njit(cache=True, parallel=True, boundscheck=False)
+def _final (plano, final):
+	'''
+	Kernel of final_array() over flat views of working and output array
+	'''
+	for i in prange(len(plano)):
+		final[i] = plano[i] if plano[i] >= 0 else np.inf
+
+#end final()
@@ -0,0 +1,144 @@
+/*
+Module - gdt_simd
+-----------------------------
+AVX2 two-scan chamfer for 2D non-periodic arrays, loaded by gdt_simd.py through ctypes
+
+Build (from the repository folder):
+	cc -O3 -mavx2 -shared -fPIC gdt_simd.c -o libgdt_simd.so
+Without -mavx2 the same file compiles to the scalar version of the scans
+
+Works over the working array of gdt (-1: unactualized foreground; -2: background), row-major H x W int32
+Forward scan mask (a: 4-adyacent peso; b: diagonal peso):
+	b a b		row y-1
+	a .			row y
+Backward scan mirrors it. The 3 terms of row y-1 are independent along the row and are computed 8 elements at a
+time (_mm256_add_epi32 / _mm256_min_epi32), the left (right) term depends on the previous element and stays scalar
+Scans are repeated until one leaves every value unchanged (paths around background may need more than 2),
+up to a limit given by the caller
+
+*/
+
+#include <stdint.h>
+
+#ifdef __AVX2__
+#include <immintrin.h>
+#endif
+
+#define INF (1 << 29)	/* unactualized foreground */
+#define BG (1 << 30)	/* background: BG + INF still fits in int32, BG + peso never improves a value */
+
+
+static inline int32_t min32 (int32_t a, int32_t b)
+{
+	return a < b ? a : b;
+}
+
+
+static int pass_row (int32_t* fila, const int32_t* previa, int W, int a, int b, int sentido)
+/*
+Relaxes fila (row being scanned) against previa (row already scanned) and against its previous element
+sentido: 1 = forward (left to right); -1 = backward (right to left)
+Returns 1 if any value changed
+*/
+{
+	int cambios = 0;
+	int x = 1;
+
+	if (previa != 0) {
+		/* Row terms: min(fila[x], previa[x-1] + b, previa[x] + a, previa[x+1] + b), background untouched */
+		if (fila[0] != BG) {
+			int32_t mejor = min32(fila[0], min32(previa[0] + a, W > 1 ? previa[1] + b : INF));
+			cambios = mejor != fila[0];
+			fila[0] = mejor;
+		}
+#ifdef __AVX2__
+		const __m256i va = _mm256_set1_epi32(a);
+		const __m256i vb = _mm256_set1_epi32(b);
+		const __m256i vbg = _mm256_set1_epi32(BG);
+		__m256i vcambios = _mm256_setzero_si256();
+		for (; x + 8 < W; x += 8) {
+			__m256i actual = _mm256_loadu_si256((const __m256i*)(fila + x));
+			__m256i izq = _mm256_add_epi32(_mm256_loadu_si256((const __m256i*)(previa + x - 1)), vb);
+			__m256i cen = _mm256_add_epi32(_mm256_loadu_si256((const __m256i*)(previa + x)), va);
+			__m256i der = _mm256_add_epi32(_mm256_loadu_si256((const __m256i*)(previa + x + 1)), vb);
+			__m256i mejor = _mm256_min_epi32(actual, _mm256_min_epi32(cen, _mm256_min_epi32(izq, der)));
+			mejor = _mm256_blendv_epi8(mejor, actual, _mm256_cmpeq_epi32(actual, vbg));
+			vcambios = _mm256_or_si256(vcambios, _mm256_xor_si256(mejor, actual));
+			_mm256_storeu_si256((__m256i*)(fila + x), mejor);
+		}
+		cambios |= !_mm256_testz_si256(vcambios, vcambios);
+#endif
+		for (; x < W; x++) {
+			if (fila[x] == BG)
+				continue;
+			int32_t mejor = min32(fila[x], min32(previa[x-1] + b, previa[x] + a));
+			if (x + 1 < W)
+				mejor = min32(mejor, previa[x+1] + b);
+			cambios |= mejor != fila[x];
+			fila[x] = mejor;
+		}
+	}
+
+	/* Element term, sequential along the scan direction */
+	int inicio = sentido > 0 ? 1 : W - 2;
+	for (x = inicio; x >= 0 && x < W; x += sentido) {
+		if (fila[x] == BG)
+			continue;
+		int32_t value = fila[x - sentido] + a;
+		if (value < fila[x]) {
+			fila[x] = value;
+			cambios = 1;
+		}
+	}
+	return cambios;
+}
+
+
+int chamfer_forward_2d (int32_t* D, int H, int W, int a, int b)
+/*
+Forward scan (top to bottom, left to right), returns 1 if any value changed
+*/
+{
+	int cambios = 0;
+	for (int y = 0; y < H; y++)
+		cambios |= pass_row(D + (int64_t)y * W, y > 0 ? D + (int64_t)(y-1) * W : 0, W, a, b, 1);
+	return cambios;
+}
+
+
+int chamfer_backward_2d (int32_t* D, int H, int W, int a, int b)
+/*
+Backward scan (bottom to top, right to left), returns 1 if any value changed
+*/
+{
+	int cambios = 0;
+	for (int y = H - 1; y >= 0; y--)
+		cambios |= pass_row(D + (int64_t)y * W, y < H - 1 ? D + (int64_t)(y+1) * W : 0, W, a, b, -1);
+	return cambios;
+}
+
+
+int chamfer_2d (int32_t* D, int H, int W, int a, int b, int limite)
+/*
+Fills D in place with distances to the nearest origin, origins being the foreground elements set to 0 by the caller
+(every other element must be -1 or -2)
+b >= INF disables the diagonal terms (city)
+Returns 0, with D back to unactualized, if scans do not converge within limite scans
+*/
+{
+	int64_t n = (int64_t)H * W;
+	for (int64_t i = 0; i < n; i++)
+		D[i] = D[i] == -2 ? BG : (D[i] == 0 ? 0 : INF);
+
+	int scans = 0;
+	int cambios = 1;
+	while ((cambios || scans < 2) && scans < limite) {
+		cambios = scans % 2 == 0 ? chamfer_forward_2d(D, H, W, a, b) : chamfer_backward_2d(D, H, W, a, b);
+		scans++;
+	}
+	int estable = !cambios && scans >= 2;
+
+	for (int64_t i = 0; i < n; i++)
+		D[i] = D[i] == BG ? -2 : (D[i] >= INF || !estable ? -1 : D[i]);
+	return estable;
+}
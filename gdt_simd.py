@@ -0,0 +1,44 @@
+'''
+Module - gdt_simd
+-----------------------------
+ctypes loader of libgdt_simd.so (compiled from gdt_simd.c, see build command there)
+Used by gdt.dist() for 2D non-periodic arrays, the two-scan chamfer runs with AVX2 over 8 elements of a row at a time
+
+Raises ImportError when the library has not been built, so gdt keeps the other kernels
+
+'''
+
+import ctypes
+import os
+
+import numpy as np
+
+try:
+	_LIB = ctypes.CDLL(os.path.join(os.path.dirname(os.path.abspath(__file__)), "libgdt_simd.so"))
+except OSError:
+	raise ImportError ("Error: libgdt_simd.so not built (see gdt_simd.c)")
+
+_LIB.chamfer_2d.restype = ctypes.c_int
+_LIB.chamfer_2d.argtypes = [np.ctypeslib.ndpointer(dtype=np.int32, ndim=2, flags="C_CONTIGUOUS")] + [ctypes.c_int]*5
+
+_SIN_DIAGONAL = 1 << 29
+#Diagonal peso used for city (4-adyacency), equal to the INF of gdt_simd.c so diagonal terms never improve a value
+
+_LIMITE_SCANS = 64
+#Scans done before giving up (see gdt_numba._LIMITE_SCANS_2D), vectorized scans are cheaper so more of them are allowed
+
+
+
+def chamfer2d (array, origenes, pesos):
+	'''
+	Fills array in place with distances to the nearest of origenes ((n_origenes, 2) coordinates) through
+	8-adyacents weighted by pesos (non-periodic)
+	pesos: 4-adyacent peso, followed by the diagonal peso when the metric uses 8-adyacency
+	origenes must be unactualized foreground
+	Returns False, with array back to unactualized, if scans do not converge within _LIMITE_SCANS
+	'''
+	b = int(pesos[1]) if len(pesos) > 1 else _SIN_DIAGONAL
+	array[tuple(origenes.T)] = 0	#chamfer_2d() takes the elements at 0 as origins
+	return bool(_LIB.chamfer_2d(array, array.shape[0], array.shape[1], int(pesos[0]), b, _LIMITE_SCANS))
+
+#end chamfer2d()